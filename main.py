@@ -1,13 +1,47 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import uvicorn
-import os, json, re, logging, io
+import asyncio
+import os, json, re, logging, io, hashlib, threading
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
+from cachetools import TTLCache, LRUCache
 from PIL import Image as PILImage
-import google.generativeai as genai
+import httpx
+from google import genai
+from google.genai import types as genai_types
+import orjson
+
+# Optional: SIMD-accelerated hashing for the upload content cache
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional: semantic reuse for near-duplicate strings (needs sentence-transformers)
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# Optional: local ONNX models (validate-image classifier, int8 embedder)
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
 
 # ====== Load ENV and configure logging ======
 load_dotenv()
@@ -18,12 +52,13 @@ logger = logging.getLogger("farmassist")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     logger.error("GEMINI_API_KEY not found in environment")
-genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
 app = FastAPI(
     title="FarmAssist Pro",
     version="3.0.0",
-    description="AI-powered farming assistant with real-time image analysis"
+    description="AI-powered farming assistant with real-time image analysis",
+    default_response_class=ORJSONResponse,
 )
 
 # ====== CORS ======
@@ -41,71 +76,475 @@ class TextQueryRequest(BaseModel):
     language: str = "en"
     context: Optional[Dict[str, Any]] = None
 
+# ==================== TRANSLATION CACHE =====================
+# Analyze endpoints translate the same short strings ("mild", "severe",
+# "disease", product names...) on every request; each miss is a full Gemini
+# round trip, so cache (target_lang, text) -> translation with a TTL.
+_TRANSLATION_CACHE: TTLCache = TTLCache(
+    maxsize=int(os.getenv("TRANSLATION_CACHE_SIZE", "4096")),
+    ttl=int(os.getenv("TRANSLATION_CACHE_TTL", "3600")),
+)
+# cachetools containers are not thread-safe, and the translation caches are
+# touched from both the event loop and asyncio.to_thread workers (even .get
+# mutates: TTL expiry / LRU reordering). Hold this lock around every access;
+# embedding inference stays outside it.
+_CACHE_LOCK = threading.Lock()
+
+# Enum-like values that show up in almost every analysis response; translated
+# once at startup so the per-request field loops hit the cache immediately.
+_COMMON_TERMS = [
+    "mild", "moderate", "severe",
+    "disease", "pest", "deficiency",
+    "low", "medium", "high",
+]
+_WARMUP_LANGS = ["hi", "kn"]
+
+# Per-language index of text -> (embedding, translation) used for semantic
+# reuse: a new string whose embedding is nearly identical (cosine > 0.95) to
+# an already-translated one reuses that translation instead of calling
+# Gemini. LRU-bounded: unlike _TRANSLATION_CACHE it has no TTL, so an
+# unbounded list would re-accumulate duplicates forever on a long-running
+# worker while the per-miss linear scan got slower and slower.
+_SEMANTIC_THRESHOLD = 0.95
+_SEMANTIC_INDEX_SIZE = int(os.getenv("SEMANTIC_INDEX_SIZE", "2048"))
+_semantic_index: Dict[str, LRUCache] = {}
+
+# Path to an int8-quantized MiniLM ONNX export (onnxruntime
+# quantize_dynamic, weight_type=QInt8) with tokenizer.json alongside it.
+# Roughly 5x cheaper per embedding on CPU than the full-precision
+# sentence-transformers model, which stays as the fallback.
+_EMBEDDER_PATH = os.getenv("TRANSLATION_EMBEDDER_PATH", "")
+
+@lru_cache(maxsize=1)
+def _get_onnx_embedder():
+    if not _EMBEDDER_PATH or onnxruntime is None or np is None or Tokenizer is None:
+        return None
+    try:
+        sess = onnxruntime.InferenceSession(
+            _EMBEDDER_PATH, providers=["CPUExecutionProvider"]
+        )
+        tok = Tokenizer.from_file(
+            os.path.join(os.path.dirname(_EMBEDDER_PATH), "tokenizer.json")
+        )
+        return sess, tok
+    except Exception as e:
+        logger.warning("onnx embedder disabled: %s", e)
+        return None
+
+@lru_cache(maxsize=1)
+def _get_embedder():
+    if SentenceTransformer is None:
+        return None
+    try:
+        return SentenceTransformer("all-MiniLM-L6-v2")
+    except Exception as e:
+        logger.warning("semantic translation cache disabled: %s", e)
+        return None
+
+def _embed(text: str):
+    """L2-normalized embedding of text, or None when no embedder is usable."""
+    onnx = _get_onnx_embedder()
+    if onnx is not None:
+        sess, tok = onnx
+        enc = tok.encode(text)
+        ids = np.array([enc.ids], dtype=np.int64)
+        feeds = {"input_ids": ids,
+                 "attention_mask": np.array([enc.attention_mask], dtype=np.int64)}
+        if any(i.name == "token_type_ids" for i in sess.get_inputs()):
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        vec = sess.run(None, feeds)[0][0].mean(axis=0)  # mean-pool tokens
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+    embedder = _get_embedder()
+    if embedder is not None:
+        return embedder.encode(text, normalize_embeddings=True)
+    return None
+
+def _semantic_lookup(target_lang: str, text: str) -> Optional[str]:
+    with _CACHE_LOCK:
+        entries = _semantic_index.get(target_lang)
+        candidates = list(entries.values()) if entries else []
+    if not candidates:
+        return None
+    vec = _embed(text)
+    if vec is None:
+        return None
+    for other_vec, translation in candidates:
+        if float(np.dot(vec, other_vec)) > _SEMANTIC_THRESHOLD:
+            return translation
+    return None
+
+def _store_translation(target_lang: str, text: str, translation: str) -> None:
+    # Embedding is blocking CPU work; call via asyncio.to_thread from handlers
+    with _CACHE_LOCK:
+        _TRANSLATION_CACHE[(target_lang, text)] = translation
+        entries = _semantic_index.setdefault(
+            target_lang, LRUCache(maxsize=_SEMANTIC_INDEX_SIZE)
+        )
+        if text in entries:
+            return
+    vec = _embed(text)
+    if vec is not None:
+        with _CACHE_LOCK:
+            entries[text] = (vec, translation)
+
+def _store_translations(target_lang: str, pairs: List[Tuple[str, str]]) -> None:
+    for text, translation in pairs:
+        _store_translation(target_lang, text, translation)
+
+# ==================== ANALYSIS RESULT CACHE ====================
+# Farmers often re-submit the same photo (retry after an error, app
+# reconnect, sharing); key the finished analyze payload by
+# (content hash, endpoint, language) so identical re-uploads skip Gemini.
+# The payload is cached post-translation, hence language in the key.
+_ANALYSIS_CACHE: TTLCache = TTLCache(
+    maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("ANALYSIS_CACHE_TTL", "86400")),
+)
+
+def _hash_upload(file: UploadFile) -> str:
+    # Chunked read over the spooled temp file; never holds the whole body.
+    # blake3 runs at multiple GB/s (SIMD), so hashing a 10MB photo is sub-ms;
+    # OpenSSL's sha256 (SHA-NI where available) is the fallback.
+    h = blake3.blake3() if blake3 is not None else hashlib.sha256()
+    file.file.seek(0)
+    for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+        h.update(chunk)
+    file.file.seek(0)
+    return h.hexdigest()
+
+# ==================== LOCAL IMAGE VALIDATION ====================
+# /api/validate/image only needs a yes/no "is this agricultural?" answer; a
+# small local ONNX classifier (binary: agricultural vs other) answers in tens
+# of ms on CPU vs a >500ms Gemini round trip. Point AGRI_CLASSIFIER_PATH at
+# the exported model; Gemini stays the fallback when the model is missing or
+# below the confidence threshold.
+_AGRI_CLASSIFIER_PATH = os.getenv("AGRI_CLASSIFIER_PATH", "")
+_AGRI_CONFIDENCE_THRESHOLD = 0.6
+
+@lru_cache(maxsize=1)
+def _get_agri_classifier():
+    if not _AGRI_CLASSIFIER_PATH or onnxruntime is None or np is None:
+        return None
+    try:
+        return onnxruntime.InferenceSession(
+            _AGRI_CLASSIFIER_PATH, providers=["CPUExecutionProvider"]
+        )
+    except Exception as e:
+        logger.warning("local validation classifier disabled: %s", e)
+        return None
+
+def _classify_agricultural(image: PILImage.Image) -> Optional[bool]:
+    """Return True/False when the local model is confident, else None."""
+    sess = _get_agri_classifier()
+    if sess is None:
+        return None
+    try:
+        inp = sess.get_inputs()[0]
+        side = inp.shape[-1] if isinstance(inp.shape[-1], int) else 224
+        arr = np.asarray(image.resize((side, side)), dtype=np.float32) / 255.0
+        arr = ((arr - 0.5) / 0.5).transpose(2, 0, 1)[None, ...]
+        logits = sess.run(None, {inp.name: arr})[0][0]
+        exp = np.exp(logits - logits.max())
+        probs = exp / exp.sum()
+        if float(probs.max()) < _AGRI_CONFIDENCE_THRESHOLD:
+            return None
+        return int(probs.argmax()) == 0  # class 0 = agricultural
+    except Exception as e:
+        logger.warning("local validation classifier error: %s", e)
+        return None
+
 # ======================== HELPERS ===========================
-def build_model(name: str = "gemini-1.5-flash"):
-    return genai.GenerativeModel(name)
+# Cap concurrent Gemini calls so gather() fan-out respects API rate limits.
+_GEMINI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+
+# json_output=True makes Gemini emit native application/json, so parsing is
+# a plain json.loads with no extraction heuristics.
+_JSON_CONFIG = genai_types.GenerateContentConfig(
+    response_mime_type="application/json"
+)
+
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    # One process-wide client so every call shares the pooled async HTTP
+    # transport instead of each request opening its own connections.
+    return genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options=genai_types.HttpOptions(
+            async_client_args={
+                "limits": httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            }
+        ),
+    )
+
+async def _generate_async(contents, json_output: bool = False, config=None):
+    if config is None and json_output:
+        config = _JSON_CONFIG
+    async with _GEMINI_SEMAPHORE:
+        return await get_client().aio.models.generate_content(
+            model=GEMINI_MODEL, contents=contents, config=config
+        )
+
+# Uploads below this size decode inline; thread dispatch costs more than the
+# decode itself for tiny payloads.
+_DECODE_OFFLOAD_THRESHOLD = 64 * 1024
+# Gemini downscales internally anyway, so keep at most this many px per side
+_MAX_IMAGE_DIM = 1024
+
+def _upload_size(file: UploadFile) -> int:
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+def _decode_upload(file: UploadFile) -> Tuple[PILImage.Image, genai_types.Part]:
+    # Starlette spools uploads to a temp file; let Pillow read it directly
+    # instead of copying the whole body into a bytes object first.
+    image = PILImage.open(file.file, formats=("JPEG", "PNG", "WEBP"))
+    # For JPEGs, let libjpeg DCT-downscale toward the target size during
+    # decode instead of decoding the full-resolution image first (no-op for
+    # other formats).
+    image.draft("RGB", (_MAX_IMAGE_DIM, _MAX_IMAGE_DIM))
+    if image.mode != "RGB":
+        # convert() copies the whole pixel buffer; camera JPEGs already
+        # decode as RGB, so skip it when possible
+        image = image.convert("RGB")
+    if max(image.size) > _MAX_IMAGE_DIM:
+        image.thumbnail((_MAX_IMAGE_DIM, _MAX_IMAGE_DIM), PILImage.Resampling.LANCZOS)
+    # Re-encode as WebP and wrap the bytes in a Part: handing the SDK a PIL
+    # image makes it re-encode as lossless PNG on the event loop, ~15x the
+    # size of a quality-80 WebP of the same 1024px photo.
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=80, method=4)
+    part = genai_types.Part.from_bytes(data=buf.getvalue(), mime_type="image/webp")
+    return image, part
+
+async def open_upload_image(file: UploadFile) -> Tuple[PILImage.Image, genai_types.Part]:
+    """Decode an upload; returns the PIL image and the Part sent to Gemini."""
+    # Pillow decode is CPU-bound; run large images off the event loop
+    if _upload_size(file) > _DECODE_OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(_decode_upload, file)
+    return _decode_upload(file)
+
+# Parses above this size run in a worker thread to keep the event loop free
+_LARGE_PARSE_THRESHOLD = 100_000
+
+def _extract_json_block(text: str) -> Optional[str]:
+    # Single forward pass: slice the first balanced {...} block, tracking
+    # string literals and escapes so braces inside strings don't count.
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
 def safe_json_parse(text: str) -> Dict[str, Any]:
-    # Try find first JSON block
+    # Fast path: the whole response is already valid JSON
     try:
-        match = re.search(r'\{[\s\S]*\}', text)
-        if match:
-            return json.loads(match.group(0))
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception:
-        return {}
-
-def translate_text(text: str, target_lang: str) -> str:
+        pass
+    block = _extract_json_block(text)
+    if block is not None:
+        try:
+            return orjson.loads(block)
+        except Exception:
+            pass
+    return {}
+
+async def safe_json_parse_async(text: str) -> Dict[str, Any]:
+    if len(text) > _LARGE_PARSE_THRESHOLD:
+        return await asyncio.to_thread(safe_json_parse, text)
+    return safe_json_parse(text)
+
+async def translate_text_async(text: str, target_lang: str) -> str:
     if not text or target_lang == "en":
         return text
+    with _CACHE_LOCK:
+        hit = _TRANSLATION_CACHE.get((target_lang, text))
+    if hit is not None:
+        return hit
     try:
+        # Embedding inference is 10-30ms of blocking CPU; keep it off the loop
+        reused = await asyncio.to_thread(_semantic_lookup, target_lang, text)
+        if reused is not None:
+            with _CACHE_LOCK:
+                _TRANSLATION_CACHE[(target_lang, text)] = reused
+            return reused
         lang_name = "Hindi" if target_lang == "hi" else "Kannada" if target_lang == "kn" else "English"
         prompt = f"Translate this to {lang_name}. Return only the translated text:\n\n{text}"
-        resp = build_model().generate_content(prompt)
-        return (resp.text or "").strip()
-    except Exception as e:
-        logger.warning(f"translate_text error: {e}")
-        return text
-
-def translate_to_en(text: str, source_lang: str) -> str:
-    if not text or source_lang == "en":
-        return text
-    try:
-        prompt = f"Translate this to English. Return only the translated text:\n\n{text}"
-        resp = build_model().generate_content(prompt)
-        return (resp.text or "").strip()
+        resp = await _generate_async(prompt)
+        result = (resp.text or "").strip()
+        if result:
+            await asyncio.to_thread(_store_translation, target_lang, text, result)
+        return result or text
     except Exception as e:
-        logger.warning(f"translate_to_en error: {e}")
+        logger.warning("translate_text error: %s", e)
         return text
 
-def translate_list(items: List[str], lang: str) -> List[str]:
-    return [translate_text(x, lang) for x in (items or [])]
+async def translate_batch(strings: List[str], lang: str) -> Tuple[List[str], bool]:
+    """Translate many strings in one Gemini call instead of one call each.
+
+    Returns (results, ok); ok is False when the batch call failed and the
+    per-string fallback ran, since that path substitutes the untranslated
+    source text on error and the output may be partly English.
+    """
+    if lang == "en" or not strings:
+        return list(strings), True
+    results: List[Optional[str]] = [None] * len(strings)
+    pending: List[str] = []
+    pending_idx: List[int] = []
+    with _CACHE_LOCK:
+        for i, s in enumerate(strings):
+            if not s:
+                results[i] = s
+                continue
+            hit = _TRANSLATION_CACHE.get((lang, s))
+            if hit is not None:
+                results[i] = hit
+            else:
+                pending.append(s)
+                pending_idx.append(i)
+    ok = True
+    if pending:
+        try:
+            lang_name = "Hindi" if lang == "hi" else "Kannada" if lang == "kn" else "English"
+            prompt = (
+                f"Translate each string in this JSON array to {lang_name}. "
+                "Return a JSON array of the same length and order, nothing else:\n"
+                + json.dumps(pending, ensure_ascii=False)
+            )
+            resp = await _generate_async(prompt, json_output=True)
+            translated = orjson.loads((resp.text or "").strip())
+            if not isinstance(translated, list) or len(translated) != len(pending):
+                raise ValueError("batch translation returned wrong shape")
+            stored = []
+            for i, src, out in zip(pending_idx, pending, translated):
+                out = (str(out) if out is not None else "").strip() or src
+                results[i] = out
+                stored.append((src, out))
+            # One worker-thread hop to cache and embed the whole batch
+            await asyncio.to_thread(_store_translations, lang, stored)
+        except Exception as e:
+            logger.warning("translate_batch error: %s", e)
+            # Fall back to per-string translation, fanned out concurrently
+            fallback = await asyncio.gather(
+                *(translate_text_async(src, lang) for src in pending)
+            )
+            for i, out in zip(pending_idx, fallback):
+                results[i] = out
+            ok = False
+    return results, ok
+
+async def _apply_translations(refs: List[Any], lang: str) -> bool:
+    """Translate all referenced fields with a single batched call.
+
+    refs is a list of (container, key) pairs where container[key] is a string;
+    container may be a dict or a list (key is then an index). Returns True
+    when every translation came from the batch path or the cache; False means
+    some fields may still be English and the result should not be cached.
+    """
+    if lang == "en" or not refs:
+        return True
+    translated, ok = await translate_batch([c[k] for c, k in refs], lang)
+    for (c, k), out in zip(refs, translated):
+        c[k] = out
+    return ok
+
+# Product keyword -> shop URL. Compiled into one alternation regex so lookup
+# is a single O(n) scan instead of one substring pass per keyword.
+_MEDICINE_URLS = {
+    "mancozeb": "https://www.bighaat.com/products/indofil-m-45-mancozeb-75-wp-500-gm",
+    "propiconazole": "https://www.bighaat.com/products/tilt-propiconazole-25-ec",
+    "copper oxychloride": "https://www.bighaat.com/products/copper-oxychloride-50-wp-500gm",
+    "carbendazim": "https://www.bighaat.com/products/bavistin-carbendazim-50-wp-100-gm",
+    "sulphur": "https://www.bighaat.com/products/sulfex-80-wdg-sulphur-1-kg",
+    "imidacloprid": "https://www.bighaat.com/products/command-imidacloprid-17-8-sl",
+    "chlorpyrifos": "https://www.bighaat.com/collections/insecticides",
+    "acetamiprid": "https://www.bighaat.com/collections/insecticides",
+    "thiamethoxam": "https://www.bighaat.com/collections/insecticides",
+    "neem": "https://www.bighaat.com/products/neem-oil-azadirachtin-300-ppm",
+    "urea": "https://www.bighaat.com/collections/fertilizers",
+    "npk": "https://www.bighaat.com/collections/fertilizers",
+    "dap": "https://www.bighaat.com/collections/fertilizers",
+}
+_MEDICINE_RE = re.compile("|".join(re.escape(k) for k in _MEDICINE_URLS))
+_DEFAULT_MEDICINE_URL = "https://www.bighaat.com/collections/pest-disease-management"
 
 def get_medicine_link(primary_text: str) -> str:
-    t = (primary_text or "").lower()
-    mapping = [
-        ("mancozeb", "https://www.bighaat.com/products/indofil-m-45-mancozeb-75-wp-500-gm"),
-        ("propiconazole", "https://www.bighaat.com/products/tilt-propiconazole-25-ec"),
-        ("copper oxychloride", "https://www.bighaat.com/products/copper-oxychloride-50-wp-500gm"),
-        ("carbendazim", "https://www.bighaat.com/products/bavistin-carbendazim-50-wp-100-gm"),
-        ("sulphur", "https://www.bighaat.com/products/sulfex-80-wdg-sulphur-1-kg"),
-        ("imidacloprid", "https://www.bighaat.com/products/command-imidacloprid-17-8-sl"),
-        ("chlorpyrifos", "https://www.bighaat.com/collections/insecticides"),
-        ("acetamiprid", "https://www.bighaat.com/collections/insecticides"),
-        ("thiamethoxam", "https://www.bighaat.com/collections/insecticides"),
-        ("neem", "https://www.bighaat.com/products/neem-oil-azadirachtin-300-ppm"),
-        ("urea", "https://www.bighaat.com/collections/fertilizers"),
-        ("npk", "https://www.bighaat.com/collections/fertilizers"),
-        ("dap", "https://www.bighaat.com/collections/fertilizers"),
-    ]
-    for key, url in mapping:
-        if key in t:
-            return url
-    return "https://www.bighaat.com/collections/pest-disease-management"
-
-def ask_gemini_json(prompt: str, image: PILImage.Image) -> Dict[str, Any]:
-    resp = build_model().generate_content([prompt, image])
-    parsed = safe_json_parse(resp.text or "")
+    match = _MEDICINE_RE.search((primary_text or "").lower())
+    return _MEDICINE_URLS[match.group(0)] if match else _DEFAULT_MEDICINE_URL
+
+# ==================== GEMINI CONTEXT CACHING ====================
+# The analysis prompts are fixed multi-hundred-token strings re-sent on every
+# call. Register them as Gemini cached content once at startup so the server
+# reuses the pre-encoded prefix; falls back to inline prompts if the API
+# rejects the cache (e.g. prompt below the minimum cached token count).
+_PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+_prompt_caches: Dict[str, Any] = {}
+# Keeps a strong reference to the refresh loop; the event loop only holds a
+# weak one, so an unreferenced task can be garbage-collected mid-sleep.
+_prompt_cache_task: Optional[asyncio.Task] = None
+
+def _create_prompt_cache(prompt: str):
+    return get_client().caches.create(
+        model=GEMINI_MODEL,
+        config=genai_types.CreateCachedContentConfig(
+            system_instruction=prompt,
+            ttl=f"{_PROMPT_CACHE_TTL}s",
+        ),
+    )
+
+async def _refresh_prompt_caches(prompts: List[str]) -> None:
+    # Recreate the caches a bit before their TTL expires
+    while True:
+        for p in prompts:
+            try:
+                _prompt_caches[p] = await asyncio.to_thread(_create_prompt_cache, p)
+            except Exception as e:
+                logger.warning("context caching unavailable, using inline prompts: %s", e)
+                _prompt_caches.clear()
+                return
+        await asyncio.sleep(_PROMPT_CACHE_TTL * 0.9)
+
+async def ask_gemini_json(prompt: str, image_part: genai_types.Part) -> Dict[str, Any]:
+    cache = _prompt_caches.get(prompt)
+    if cache is not None:
+        config = genai_types.GenerateContentConfig(
+            cached_content=cache.name,
+            response_mime_type="application/json",
+        )
+        try:
+            resp = await _generate_async([image_part], config=config)
+        except Exception as e:
+            # The server-side cache can expire or be evicted under us; drop
+            # the stale entry (the refresh loop will recreate it) and retry
+            # once with the inline prompt rather than failing the request.
+            logger.warning("cached-content generate failed, retrying inline: %s", e)
+            _prompt_caches.pop(prompt, None)
+            resp = await _generate_async([prompt, image_part], json_output=True)
+    else:
+        resp = await _generate_async([prompt, image_part], json_output=True)
+    parsed = await safe_json_parse_async(resp.text or "")
     return parsed
 
 # ========================= Prompts =========================
@@ -158,6 +597,25 @@ Be exact and practical. Do not make up unknowns.
 """
 
 # ========================= API =========================
+@app.on_event("startup")
+async def init_prompt_caches():
+    global _prompt_cache_task
+    if not GEMINI_API_KEY:
+        return
+    _prompt_cache_task = asyncio.create_task(
+        _refresh_prompt_caches([PLANT_PROMPT, SOIL_PROMPT, PEST_PROMPT])
+    )
+
+@app.on_event("startup")
+async def warm_translation_cache():
+    if not GEMINI_API_KEY:
+        return
+    await asyncio.gather(
+        *(translate_text_async(term, lang)
+          for lang in _WARMUP_LANGS for term in _COMMON_TERMS)
+    )
+    logger.info("Translation cache warmed for %s", ", ".join(_WARMUP_LANGS))
+
 @app.get("/")
 def root():
     return {"message": "FarmAssist Pro API Running", "version": "3.0.0"}
@@ -165,23 +623,27 @@ def root():
 @app.post("/api/validate/image")
 async def validate_image(file: UploadFile = File(...), language: str = Form("en")):
     try:
-        img_bytes = await file.read()
-        image = PILImage.open(io.BytesIO(img_bytes)).convert("RGB")
-        prompt = "Is this image related to agriculture (plants/crops/soil/pests/farming)? Answer strictly 'Yes' or 'No'."
-        resp = build_model().generate_content([prompt, image])
-        is_agri = "yes" in (resp.text or "").strip().lower()
+        image, image_part = await open_upload_image(file)
+        is_agri = await asyncio.to_thread(_classify_agricultural, image)
+        if is_agri is None:
+            prompt = "Is this image related to agriculture (plants/crops/soil/pests/farming)? Answer strictly 'Yes' or 'No'."
+            resp = await _generate_async([prompt, image_part])
+            is_agri = "yes" in (resp.text or "").strip().lower()
         message = "Image validated successfully" if is_agri else "Please upload an agriculture-related image"
-        return {"success": True, "is_agricultural": is_agri, "message": translate_text(message, language)}
+        return {"success": True, "is_agricultural": is_agri, "message": await translate_text_async(message, language)}
     except Exception as e:
-        logger.error(f"/validate error: {e}")
+        logger.error("/validate error: %s", e)
         return {"success": False, "is_agricultural": False, "message": "Validation failed, please try again."}
 
-@app.post("/api/analyze/plant")
+@app.post("/api/analyze/plant", response_class=ORJSONResponse)
 async def analyze_plant(file: UploadFile = File(...), language: str = Form("en")):
     try:
-        img_bytes = await file.read()
-        image = PILImage.open(io.BytesIO(img_bytes)).convert("RGB")
-        data = ask_gemini_json(PLANT_PROMPT, image)
+        cache_key = (await asyncio.to_thread(_hash_upload, file), "plant", language)
+        cached = _ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return ORJSONResponse(cached)
+        _, image_part = await open_upload_image(file)
+        data = await ask_gemini_json(PLANT_PROMPT, image_part)
         if not data or "plant" not in data:
             raise HTTPException(status_code=422, detail="AI could not extract plant details. Try a clearer image.")
 
@@ -197,31 +659,30 @@ async def analyze_plant(file: UploadFile = File(...), language: str = Form("en")
         score = health.get("score", 0)
         first_issue = (issues[0].get("name") if issues else "") or ""
         first_chem = ((treatment.get("chemical") or [{}])[0].get("product") or "")
-        summary_en = f"Identified: {common}{f' ({sci})' if sci else ''}. Health score: {score}/100."
-        if first_issue:
-            summary_en += f" Primary issue: {first_issue}."
-        if first_chem:
-            summary_en += f" Recommended treatment: {first_chem}."
+        summary_en = "".join([
+            f"Identified: {common}{f' ({sci})' if sci else ''}. Health score: {score}/100.",
+            f" Primary issue: {first_issue}." if first_issue else "",
+            f" Recommended treatment: {first_chem}." if first_chem else "",
+        ])
         buy_url = get_medicine_link(first_chem or first_issue or common)
 
-        # Translate user-facing fields (keep names mostly as-is)
-        summary = translate_text(summary_en, language)
+        # Translate user-facing fields (keep names mostly as-is) in one batch
+        holder = {"summary": summary_en}
+        prevention = list(prevention or [])
+        refs = [(holder, "summary")]
         for it in issues:
-            it["name"] = translate_text(it.get("name",""), language)
-            it["type"] = translate_text(it.get("type",""), language)
-            it["severity"] = translate_text(it.get("severity",""), language)
-            it["evidence"] = translate_list(it.get("evidence", []), language)
+            it["evidence"] = list(it.get("evidence") or [])
+            refs += [(it, k) for k in ("name", "type", "severity") if it.get(k)]
+            refs += [(it["evidence"], i) for i in range(len(it["evidence"]))]
         for c in (treatment.get("chemical") or []):
-            c["product"] = translate_text(c.get("product",""), language)
-            c["dose"] = translate_text(c.get("dose",""), language)
-            c["notes"] = translate_text(c.get("notes",""), language)
+            refs += [(c, k) for k in ("product", "dose", "notes") if c.get(k)]
         for o in (treatment.get("organic") or []):
-            o["method"] = translate_text(o.get("method",""), language)
-            o["dose"] = translate_text(o.get("dose",""), language)
-            o["notes"] = translate_text(o.get("notes",""), language)
-        prevention = translate_list(prevention, language)
+            refs += [(o, k) for k in ("method", "dose", "notes") if o.get(k)]
+        refs += [(prevention, i) for i in range(len(prevention))]
+        translations_ok = await _apply_translations(refs, language)
+        summary = holder["summary"]
 
-        return {
+        payload = {
             "success": True,
             "plant": plant,
             "health": health,
@@ -231,18 +692,26 @@ async def analyze_plant(file: UploadFile = File(...), language: str = Form("en")
             "summary": summary,
             "medicine_links": {"url": buy_url}
         }
+        # Don't cache partially-translated payloads for the full TTL; a
+        # transient translation failure should be retried on the next upload.
+        if translations_ok:
+            _ANALYSIS_CACHE[cache_key] = payload
+        return ORJSONResponse(payload)
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"/analyze/plant error: {e}")
+        logger.error("/analyze/plant error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to analyze plant image.")
 
-@app.post("/api/analyze/soil")
+@app.post("/api/analyze/soil", response_class=ORJSONResponse)
 async def analyze_soil(file: UploadFile = File(...), language: str = Form("en")):
     try:
-        img_bytes = await file.read()
-        image = PILImage.open(io.BytesIO(img_bytes)).convert("RGB")
-        data = ask_gemini_json(SOIL_PROMPT, image)
+        cache_key = (await asyncio.to_thread(_hash_upload, file), "soil", language)
+        cached = _ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return ORJSONResponse(cached)
+        _, image_part = await open_upload_image(file)
+        data = await ask_gemini_json(SOIL_PROMPT, image_part)
         if not data or "soil" not in data:
             raise HTTPException(status_code=422, detail="AI could not extract soil details. Try a clearer image.")
 
@@ -257,19 +726,23 @@ async def analyze_soil(file: UploadFile = File(...), language: str = Form("en"))
         ph = health.get("ph_estimate", "")
         om = health.get("organic_matter", "")
         summary_en = f"{soil_type} detected. pH: {ph or 'N/A'}, Organic matter: {om or 'N/A'}. Recommended crops: {', '.join(suitable_crops[:3]) if suitable_crops else 'N/A'}."
-        summary = translate_text(summary_en, language)
 
-        suitable_crops = translate_list(suitable_crops, language)
-        recommendations = translate_list(recommendations, language)
+        # Translate user-facing fields in one batch
+        holder = {"summary": summary_en}
+        suitable_crops = list(suitable_crops or [])
+        recommendations = list(recommendations or [])
+        refs = [(holder, "summary")]
+        refs += [(suitable_crops, i) for i in range(len(suitable_crops))]
+        refs += [(recommendations, i) for i in range(len(recommendations))]
         for f in fertilizer_plan:
-            f["product"] = translate_text(f.get("product",""), language)
-            f["dose"] = translate_text(f.get("dose",""), language)
-            f["notes"] = translate_text(f.get("notes",""), language)
+            refs += [(f, k) for k in ("product", "dose", "notes") if f.get(k)]
+        translations_ok = await _apply_translations(refs, language)
+        summary = holder["summary"]
 
         first_fert = (fertilizer_plan[0]["product"] if fertilizer_plan else "") or "fertilizer"
         buy_url = get_medicine_link(first_fert)
 
-        return {
+        payload = {
             "success": True,
             "soil": soil,
             "health": health,
@@ -280,18 +753,26 @@ async def analyze_soil(file: UploadFile = File(...), language: str = Form("en"))
             "summary": summary,
             "medicine_links": {"url": buy_url}
         }
+        # Don't cache partially-translated payloads for the full TTL; a
+        # transient translation failure should be retried on the next upload.
+        if translations_ok:
+            _ANALYSIS_CACHE[cache_key] = payload
+        return ORJSONResponse(payload)
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"/analyze/soil error: {e}")
+        logger.error("/analyze/soil error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to analyze soil image.")
 
-@app.post("/api/analyze/pest")
+@app.post("/api/analyze/pest", response_class=ORJSONResponse)
 async def analyze_pest(file: UploadFile = File(...), language: str = Form("en")):
     try:
-        img_bytes = await file.read()
-        image = PILImage.open(io.BytesIO(img_bytes)).convert("RGB")
-        data = ask_gemini_json(PEST_PROMPT, image)
+        cache_key = (await asyncio.to_thread(_hash_upload, file), "pest", language)
+        cached = _ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return ORJSONResponse(cached)
+        _, image_part = await open_upload_image(file)
+        data = await ask_gemini_json(PEST_PROMPT, image_part)
         if not data or "pest" not in data:
             raise HTTPException(status_code=422, detail="AI could not extract pest details. Try a clearer image.")
 
@@ -305,21 +786,22 @@ async def analyze_pest(file: UploadFile = File(...), language: str = Form("en"))
         sev = damage.get("severity", 0)
         chem_first = (control.get("chemical") or [{}])[0].get("product", "")
         summary_en = f"{cname} detected. Damage severity: {sev}%. Recommended treatment: {chem_first or 'See control measures'}."
-        summary = translate_text(summary_en, language)
 
+        # Translate user-facing fields in one batch
+        holder = {"summary": summary_en}
+        prevention = list(prevention or [])
+        refs = [(holder, "summary")]
         for c in (control.get("chemical") or []):
-            c["product"] = translate_text(c.get("product",""), language)
-            c["dose"] = translate_text(c.get("dose",""), language)
-            c["notes"] = translate_text(c.get("notes",""), language)
+            refs += [(c, k) for k in ("product", "dose", "notes") if c.get(k)]
         for o in (control.get("organic") or []):
-            o["method"] = translate_text(o.get("method",""), language)
-            o["dose"] = translate_text(o.get("dose",""), language)
-            o["notes"] = translate_text(o.get("notes",""), language)
-        prevention = translate_list(prevention, language)
+            refs += [(o, k) for k in ("method", "dose", "notes") if o.get(k)]
+        refs += [(prevention, i) for i in range(len(prevention))]
+        translations_ok = await _apply_translations(refs, language)
+        summary = holder["summary"]
 
         buy_url = get_medicine_link(chem_first or cname)
 
-        return {
+        payload = {
             "success": True,
             "pest": pest,
             "damage": damage,
@@ -329,29 +811,47 @@ async def analyze_pest(file: UploadFile = File(...), language: str = Form("en"))
             "summary": summary,
             "medicine_links": {"url": buy_url}
         }
+        # Don't cache partially-translated payloads for the full TTL; a
+        # transient translation failure should be retried on the next upload.
+        if translations_ok:
+            _ANALYSIS_CACHE[cache_key] = payload
+        return ORJSONResponse(payload)
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"/analyze/pest error: {e}")
+        logger.error("/analyze/pest error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to analyze pest image.")
 
 @app.post("/api/chat/support")
 async def chat_support(req: TextQueryRequest):
     try:
-        query_en = translate_to_en(req.query, req.language)
+        lang_name = "Hindi" if req.language == "hi" else "Kannada" if req.language == "kn" else "English"
+        # Static instructions first so Gemini's implicit prefix caching applies
         prompt = f"""
 You are an Indian Agricultural Advisor.
-Farmer asked: {query_en}
 Provide clear, practical guidance under 180 words. Use short bullets where useful.
-Return just the answer text.
+Answer in {lang_name}. Return just the answer text.
+
+Farmer asked (in {lang_name}): {req.query}
 """
-        resp = build_model().generate_content(prompt)
-        answer_en = (resp.text or "").strip()
-        answer = translate_text(answer_en, req.language)
+        resp = await _generate_async(prompt)
+        answer = (resp.text or "").strip()
         return { "success": True, "response": { "answer": answer }, "timestamp": datetime.now().isoformat() }
     except Exception as e:
-        logger.error(f"/chat/support error: {e}")
+        logger.error("/chat/support error: %s", e)
         raise HTTPException(status_code=500, detail="Chat processing failed.")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
\ No newline at end of file
+    # reload forces a single worker; keep it opt-in for development only
+    reload = os.getenv("RELOAD", "0") == "1"
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        # "auto" picks uvloop/httptools when installed (uvloop has no
+        # Windows wheel, hence the sys_platform guard in requirements.txt)
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto"),
+        workers=1 if reload else int(os.getenv("WEB_CONCURRENCY", "4")),
+        reload=reload,
+    )
\ No newline at end of file
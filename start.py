@@ -5,10 +5,24 @@ import os
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
+    # reload forces a single worker; keep it opt-in for development only
+    reload = os.getenv("RELOAD", "0") == "1"
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", "4"))
     print("🌱 Starting FarmAssist Pro Backend API")
-    print(f"🚀 Server running on {host}:{port}")
+    print(f"🚀 Server running on {host}:{port} ({workers} worker(s))")
     print("📊 API Documentation available at:")
     print(f" - Swagger UI: http://{host}:{port}/docs")
     print(f" - ReDoc: http://{host}:{port}/redoc")
 
-    uvicorn.run("main:app", host=host, port=port, reload=True, log_level="info")
\ No newline at end of file
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        # "auto" picks uvloop/httptools when installed (uvloop has no
+        # Windows wheel, hence the sys_platform guard in requirements.txt)
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto"),
+        workers=workers,
+        reload=reload,
+        log_level="info",
+    )